@@ -1,24 +1,41 @@
 """
 Test the `hrtf_mesh_grading` binary inside a docker container.
 - Start Docker desktop
-- Set `build_container` flag below
-- Run pytest in parent directory.
+- Run pytest in parent directory. Use `pytest -n auto` to run the tests in
+  parallel (requires pytest-xdist and filelock). Each worker uses its own
+  container, volume, and test data folder. Note that each worker also compiles
+  the pmp-library in its container if `compile_pmp=True`, which takes a couple
+  of minutes. The CPU cores are split between the workers for compiling.
 
-Initialization does the following
+Initialization is done once per test session by the `container` fixture
 1. Connect to a docker client
-2. Stop and remove existing containers named `docker_name` (settings below)
-3. Build image with tag `docker_tag` if `build_container=True` (settings below)
-4. Run container
-5. Copy and compile local pmp-library if `compile_pmp=True` (settings below)
+2. Build image with tag `docker_tag` if it does not exist or the environment
+   variable `HRTF_FORCE_REBUILD=1` is set (takes a couple of minutes). During
+   parallel testing the image is only built once and the other workers wait
+   for the build to finish.
+3. Get the container named `docker_name` if it exists or run it otherwise
+4. Copy and compile local pmp-library if `compile_pmp=True` (settings below)
+5. Copy the input meshes to the docker volume `docker_volume`
 6. Run tests inside the container
+7. Stop and remove the container and volume unless the environment variable
+   `HRTF_KEEP_CONTAINER=1` is set. Keeping the container speeds up repeated
+   testing.
 
-Test files are written to the folder `test_data`.
+Test files are written to the docker volume. Results that are checked on the
+host are copied to the folder `test_data`.
 """
 # %%
 import pytest
 import os
+import contextlib
+import io
+import re
+import shlex
 import shutil
+import tarfile
+import warnings
 import docker
+from docker.utils.socket import frames_iter
 import trimesh
 import numpy as np
 import numpy.testing as npt
@@ -26,11 +43,6 @@ from requests.exceptions import HTTPError
 
 # test settings (adjust to your needs) ----------------------------------------
 
-# build the docker container
-# (required if it does not exist, takes a couple of minutes)
-build_container = False
-# Set to False if the container is already running to speed up repeated testing
-run_container = True
 # Copy and compile local pmp-library.
 compile_pmp = True
 # Do a complete new compile by removing the build directory (if it exists)
@@ -39,32 +51,224 @@ remove_build = True
 # tag and name of the docker container
 docker_tag = 'ubuntu:hrt-mesh-grading'  # used for building the container
 docker_name = 'hrt-mesh-grading'        # used for running the container
+# name of the docker volume holding the test data
+docker_volume = 'hrt-mesh-grading-data'
+
+# use separate containers and volumes for parallel testing with pytest-xdist
+worker = os.environ.get('PYTEST_XDIST_WORKER')
+if worker is not None:
+    docker_name += f'-{worker}'
+    docker_volume += f'-{worker}'
 
 
 # helper functions ------------------------------------------------------------
+# shells kept running inside the containers (see `exec`)
+shells = {}
+# marks the end of the output of a command and is followed by its exit code
+sentinel = '__DONE__'
+sentinel_pattern = re.compile(f'{sentinel}:(\\d+)\n$'.encode())
+# separates the output of commands in `exec_batch`
+marker = '---MARK---'
+# numpy types of the PLY property types (see `load_vertices`)
+ply_types = {
+    'char': 'i1', 'uchar': 'u1', 'short': 'i2', 'ushort': 'u2', 'int': 'i4',
+    'uint': 'u4', 'float': 'f4', 'double': 'f8', 'int8': 'i1', 'uint8': 'u1',
+    'int16': 'i2', 'uint16': 'u2', 'int32': 'i4', 'uint32': 'u4',
+    'float32': 'f4', 'float64': 'f8'}
+
+
 def exec(container, command, out=True):
     """
-    Run one or more commands inside a docker container.
+    Run a command inside a docker container.
+
+    The command is sent to a shell that is kept running inside the container
+    to avoid the overhead of a new `docker exec` for each call. The shell is
+    started with the low-level API of the docker client, which reuses its HTTP
+    session.
 
     Parameters
     ----------
     container : docker container
-    command : str or list of commands. Multiple commands are joined with ' && '
+    command : str or list. A string can contain any shell command and is run
+              in a subshell, i.e., changing the directory does not affect later
+              calls. A list is the program and its arguments, which are run
+              directly without the overhead of a subshell.
     out : print the output from running the commands
     """
-    # convert to list
-    if not isinstance(command, list):
-        command = [command]
-
-    # run the command
-    command = ' && '.join(command)
-    result = container.exec_run(f"sh -c '{command}'")
+    # get the shell or start it if this is the first call
+    if container.id not in shells:
+        exec_id = client.api.exec_create(container.id, 'sh', stdin=True)['Id']
+        socket = client.api.exec_start(exec_id, socket=True)
+        # the unix socket transport wraps the socket in a SocketIO, while TLS
+        # and npipe transports return a socket that can be written directly.
+        # The returned object is kept unchanged for reading the frames
+        writer = getattr(socket, '_sock', socket)
+        shells[container.id] = \
+            (exec_id, writer, frames_iter(socket, tty=False))
+    exec_id, writer, frames = shells[container.id]
+
+    # run the command. stdin is detached to not consume following commands and
+    # stderr is redirected to stdout to keep the order of the output
+    if isinstance(command, list):
+        command = shlex.join(command)
+    else:
+        command = f"( {command} )"
+    writer.sendall(
+        f"{command} < /dev/null 2>&1; echo {sentinel}:$?\n".encode())
+
+    # read until the sentinel and exit code were written. Only the end of the
+    # output is searched because the sentinel can span multiple frames
+    chunks = []
+    tail = b''
+    while sentinel_pattern.search(tail) is None:
+        try:
+            chunks.append(next(frames)[1])
+            tail = (tail + chunks[-1])[-64:]
+        except StopIteration:
+            del shells[container.id]
+            exit_code = client.api.exec_inspect(exec_id)['ExitCode']
+            raise RuntimeError(
+                f'Shell inside container {container.name} terminated with '
+                f'exit code {exit_code}')
+
+    output = b''.join(chunks)
+    match = sentinel_pattern.search(output, len(output) - len(tail))
+    exit_code = int(match.group(1))
+    output = output[:match.start()].decode()
 
     # show the
     if out:
-        print(result.output.decode())
+        print(output)
+
+    return exit_code, output
 
-    return result.exit_code, result.output.decode()
+
+def exec_batch(container, commands, out=True):
+    """
+    Run independent commands inside a docker container with a single call.
+
+    The commands are separated by markers that contain their exit codes.
+    Each command runs regardless of the exit codes of the previous commands.
+    As in `exec`, string commands run in their own subshell and do not affect
+    the following commands.
+
+    Parameters
+    ----------
+    container : docker container
+    commands : list of commands. Each command is a string or a list as
+               described in `exec`
+    out : print the output from running the commands
+
+    Returns
+    -------
+    results : list of tuples containing the exit code and output of each
+              command
+
+    Raises
+    ------
+    RuntimeError if the batch did not run all commands
+    """
+
+    commands = [shlex.join(c) if isinstance(c, list) else f"( {c} )"
+                for c in commands]
+    command = '; '.join(f"{c}; echo {marker}:$?" for c in commands)
+    exit_code, output = exec(container, command, out)
+
+    # split into [output, exit code, output, exit code, ..., '']
+    parts = re.split(f'{marker}:(\\d+)\n', output)
+
+    # the batch ends with an echo and must succeed for all commands
+    if exit_code != 0 or len(parts) // 2 != len(commands):
+        raise RuntimeError(
+            f'Batch ran {len(parts) // 2} of {len(commands)} commands and '
+            f'exited with code {exit_code}:\n{output}')
+
+    return [(int(exit_code), output)
+            for output, exit_code in zip(parts[0::2], parts[1::2])]
+
+
+def load_vertices(filename):
+    """
+    Load the vertices of a PLY file.
+
+    Only the header and the vertices are read, i.e., faces are skipped. The
+    vertices must be the first element in the file, which is the case for
+    files written by the pmp-library and Blender.
+    """
+    with open(filename, 'rb') as file:
+
+        # parse header
+        header = []
+        for line in file:
+            if line.strip() == b'end_header':
+                break
+            header.append(line.decode().split())
+        else:
+            raise ValueError(f'{filename} has no PLY header')
+
+        encoding = [line[1] for line in header if line[0] == 'format'][0]
+        elements = [line for line in header if line[0] == 'element']
+        if elements[0][1] != 'vertex':
+            raise ValueError(f'vertices must be the first element in '
+                             f'{filename}')
+        n_vertices = int(elements[0][2])
+
+        # properties of the vertices
+        start = header.index(elements[0]) + 1
+        stop = header.index(elements[1]) if len(elements) > 1 else None
+        properties = [line[1:] for line in header[start:stop]
+                      if line[0] == 'property']
+        if any(p[0] == 'list' for p in properties):
+            raise ValueError(f'list properties of vertices are not supported '
+                             f'({filename})')
+        names = [p[1] for p in properties]
+
+        # read vertices
+        if encoding == 'ascii':
+            vertices = np.loadtxt(
+                file, max_rows=n_vertices, ndmin=2,
+                usecols=[names.index(axis) for axis in 'xyz'])
+        else:
+            byteorder = '<' if encoding == 'binary_little_endian' else '>'
+            dtype = np.dtype([(name, byteorder + ply_types[kind])
+                              for kind, name in properties])
+            data = np.frombuffer(
+                file.read(n_vertices * dtype.itemsize), dtype, n_vertices)
+            vertices = np.column_stack([data[axis] for axis in 'xyz'])
+
+    return vertices.astype(np.float64)
+
+
+def is_outdated(source, target):
+    """
+    Check if `target` does not exist or is older than `source`.
+    """
+    return not os.path.isfile(target) or \
+        os.path.getmtime(source) > os.path.getmtime(target)
+
+
+def copy_to_container(container, filename):
+    """
+    Copy a file from `folders["test"]` to `folders["mount"]` in the container.
+    """
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode='w') as tar:
+        tar.add(os.path.join(folders["test"], filename), arcname=filename)
+
+    container.put_archive(folders["mount"], archive.getvalue())
+
+
+def copy_from_container(container, filename):
+    """
+    Copy a file from `folders["mount"]` in the container to `folders["test"]`.
+    """
+    stream, _ = container.get_archive(f"{folders['mount']}/{filename}")
+    archive = io.BytesIO(b''.join(stream))
+    with tarfile.open(fileobj=archive) as tar:
+        data = tar.extractfile(filename).read()
+
+    with open(os.path.join(folders["test"], filename), 'wb') as file:
+        file.write(data)
 
 
 def stop_and_remove_container(client):
@@ -93,7 +297,7 @@ current = os.path.dirname(os.path.abspath(__file__))
 
 folders = {
     # directory for writing test data
-    "test": os.path.join(current, 'test_data'),
+    "test": os.path.join(current, 'test_data', worker or ''),
     # directory containing the dockerfile
     "docker": os.path.join(current, '..'),
     # directory containing input data for testing
@@ -105,87 +309,222 @@ folders = {
     # mounting point for meshes inside docker container
     "mount": '/home/data',
     # mounting point for pmp-dev inside the container
-    "mount-pmp": '/home/pmp-dev'
+    "mount-pmp": '/home/pmp-dev',
+    # directory inside the container for discarded output (not on a mount)
+    "tmp": '/tmp'
 }
 
+# lock for building the docker image only once during parallel testing and
+# file holding the id of the test run that built the image
+build_lock = os.path.join(current, 'test_data', 'build.lock')
+build_run = os.path.join(current, 'test_data', 'build.run')
+
 del current
 
 # make test dir
 if not os.path.isdir(folders["test"]):
-    os.mkdir(folders["test"])
+    os.makedirs(folders["test"])
 
 # copy input mesh to temporary directory
-shutil.copyfile(os.path.join(folders["input"], 'head.ply'),
-                os.path.join(folders["test"], 'head_mm.ply'))
-
-# generate a version of the head with unit meter
-head = trimesh.load_mesh(os.path.join(folders["test"], "head_mm.ply"))
-head.vertices *= 0.001
-head.export(os.path.join(folders["test"], "head_m.ply"))
-
-del head
+if is_outdated(os.path.join(folders["input"], 'head.ply'),
+               os.path.join(folders["test"], 'head_mm.ply')):
+    shutil.copyfile(os.path.join(folders["input"], 'head.ply'),
+                    os.path.join(folders["test"], 'head_mm.ply'))
 
 
 # docker handling -------------------------------------------------------------
 # start docker client
 client = docker.from_env()
 
-# build container
-if build_container:
 
-    stop_and_remove_container(client)
+@pytest.fixture(scope="session")
+def container():
+    """
+    Docker container shared by all tests of the session.
+
+    An existing container named `docker_name` is reused. Otherwise a new
+    container is started. The container is stopped and removed after the
+    session unless the environment variable `HRTF_KEEP_CONTAINER=1` is set.
+    """
+
+    # warn about storage drivers that slow down the tests
+    driver = client.info()['Driver']
+    if driver in ['vfs', 'fuse-overlayfs']:
+        warnings.warn((
+            f"Docker uses the slow storage driver '{driver}'. Set "
+            "'storage-driver' to 'overlay2' in the docker daemon.json to "
+            "speed up testing"))
+
+    # build image if it does not exist or a rebuild is forced. During parallel
+    # testing the lock makes the workers wait for a single build. The building
+    # worker writes the id of the test run to not repeat a forced rebuild
+    force_rebuild = os.environ.get('HRTF_FORCE_REBUILD') == '1'
+    run = os.environ.get('PYTEST_XDIST_TESTRUNUID')
+
+    if worker is None:
+        lock = contextlib.nullcontext()
+    else:
+        import filelock
+        lock = filelock.FileLock(build_lock)
+
+    with lock:
+        rebuilt = False
+        if run is not None and os.path.isfile(build_run):
+            with open(build_run) as file:
+                rebuilt = file.read() == run
+
+        try:
+            client.images.get(docker_tag)
+            build_image = force_rebuild and not rebuilt
+        except docker.errors.ImageNotFound:
+            build_image = True
+
+        if build_image:
+            print('\nBuilding the docker image (this might take some minutes)')
+            image, log = client.images.build(
+                path=folders["docker"], tag=docker_tag, rm=True)
+
+            if run is not None:
+                with open(build_run, 'w') as file:
+                    file.write(run)
+
+    # containers of the previous image must be newly run
+    if build_image or force_rebuild:
+        stop_and_remove_container(client)
+
+    # create the volume for the test data (returns the volume if it exists)
+    client.volumes.create(name=docker_volume)
+
+    # get existing container or run it
+    try:
+        container = client.containers.get(docker_name)
+        if container.status != 'running':
+            print(f'\nStarting existing container {docker_name}')
+            container.start()
+    except docker.errors.NotFound:
+        print('\nStarting the container')
+        container = client.containers.run(
+            image=docker_tag,
+            name=docker_name,
+            # only hosts the commands from `exec` and does not need a tty
+            command=['sleep', 'infinity'],
+            # the test data lives in a volume because bind mounts are slow on
+            # Docker Desktop. 'cached' avoids synchronizing each read from the
+            # pmp-library (only has an effect on Docker Desktop for macOS)
+            mounts=[docker.types.Mount(
+                        folders["mount"], docker_volume, type="volume"),
+                    docker.types.Mount(
+                        folders["mount-pmp"], folders["pmp-dev"], type="bind",
+                        consistency="cached")],
+            detach=True,
+            tty=False,
+            stdin_open=False)
+
+    # compile local pmp-library
+    if compile_pmp:
+        print('\nCompiling local pmp-library')
+
+        command = ['rm -r pmp-library', 'cp -r pmp-dev pmp-library',
+                   'cd pmp-library']
+        if remove_build:
+            command.append('[ -d build ] && rm -rf build')
+
+        # split the CPU cores between parallel workers
+        jobs = max(1, (os.cpu_count() or 1) //
+                   int(os.environ.get('PYTEST_XDIST_WORKER_COUNT', 1)))
+
+        command.append(('mkdir -p build && cd build && cmake .. && '
+                        f'make -j {jobs} && make install'))
+        command = ' && '.join(command)
+
+        exit_code, output = exec(container, command, False)
+
+    # copy input mesh
+    copy_to_container(container, 'head_mm.ply')
+
+    yield container
+
+    # keep the container for repeated testing if requested
+    if os.environ.get('HRTF_KEEP_CONTAINER') != '1':
+        stop_and_remove_container(client)
+
+        try:
+            client.volumes.get(docker_volume).remove()
+            print(f'- removed volume {docker_volume}')
+        except HTTPError:
+            print(f'- volume {docker_volume} already removed or not existing')
+
+
+@pytest.fixture(scope="session")
+def head_m(container):
+    """
+    Version of the head with unit meter inside the container.
+
+    Only generated if required by the selected tests.
+    """
+    source = os.path.join(folders["test"], "head_mm.ply")
+    target = os.path.join(folders["test"], "head_m.ply")
+
+    if is_outdated(source, target):
+        head = trimesh.load_mesh(source)
+        head.vertices *= 0.001
+        head.export(target)
+
+    copy_to_container(container, "head_m.ply")
 
-    print('\nBuilding the docker image (this might take some minutes)')
-    image, log = client.images.build(
-        path=folders["docker"], tag=docker_tag, rm=True)
+    return "head_m.ply"
 
 
-# run the container
-if run_container:
-    # newly run the container
-    stop_and_remove_container(client)
+@pytest.fixture(scope="session")
+def references():
+    """
+    Vertices of the reference meshes (read-only).
 
-    print('\nStarting the container')
-    container = client.containers.run(
-        image=docker_tag,
-        name=docker_name,
-        command='/bin/bash',
-        volumes={folders["test"]: {
-                    "bind": folders["mount"], "mode": "rw"},
-                 folders["pmp-dev"]: {
-                    "bind": folders["mount-pmp"], "mode": "rw"}},
-        detach=True,
-        tty=True)
-else:
-    # get already running container
-    container = client.containers.get(docker_name)
+    The vertices are cached as `*.vertices.npy` next to the reference meshes
+    and memory mapped.
+    """
+    references = {}
 
+    for filename in os.listdir(folders["reference"]):
+        if not filename.endswith('.ply'):
+            continue
 
-#  compile local pmp-library --------------------------------------------------
-if compile_pmp:
-    print('\nCompiling local pmp-library')
+        ply = os.path.join(folders["reference"], filename)
+        npy = ply[:-len('.ply')] + '.vertices.npy'
 
-    command = ['rm -r pmp-library', 'cp -r pmp-dev pmp-library',
-               'cd pmp-library']
-    if remove_build:
-        command.append('[ -d build ] && rm -rf build')
+        # write to a temporary file first in case of parallel testing
+        if is_outdated(ply, npy):
+            with open(f'{npy}.{os.getpid()}', 'wb') as file:
+                np.save(file, load_vertices(ply).astype('<f4'))
+            os.replace(f'{npy}.{os.getpid()}', npy)
 
-    command.append(('mkdir -p build && cd build && cmake .. && '
-                    'make -j && make install'))
-    command = ' && '.join(command)
+        references[filename] = np.load(npy, mmap_mode='r')
 
-    exit_code, output = exec(container, command, False)
+    return references
 
 
 # tests -----------------------------------------------------------------------
-def test_help():
+# lines that are only written in verbose mode
+verbose_lines = [
+    'input:', 'output:', 'mode: hybrid', 'side:', 'min. edge length: ',
+    'max. edge length: ', 'max. error: ', 'gamma scaling left/right',
+    'estimated ear channel entrance left',
+    'estimated ear channel entrance right',
+    'Faces before remeshing: ', 'Faces after remeshing: ']
+
+# finds all lines in a single pass (longest first to not match only prefixes)
+verbose_pattern = re.compile('|'.join(
+    re.escape(line) for line in sorted(verbose_lines, key=len, reverse=True)))
+
+
+def test_help(container):
     """
     Test output for help parameter
     """
     print('\nTesting help message')
 
     # remeshing command
-    command = "hrtf_mesh_grading"
+    command = ["hrtf_mesh_grading"]
 
     # remesh
     exit_code, output = exec(container, command, False)
@@ -207,20 +546,25 @@ def test_help():
     'head_remeshed_hybrid_right_1_10.ply',
     'head_remeshed_distance_left_1_10.ply',
     'head_remeshed_distance_right_1_10.ply'])
-def test_grading_against_reference(input_file, output_file):
+def test_grading_against_reference(
+        request, container, references, input_file, output_file):
     """
     Remesh reference mesh given in m and mm and compare results to reference.
     """
 
+    # generate input mesh in m if required
+    if input_file == 'head_m.ply':
+        request.getfixturevalue('head_m')
+
     # get remeshing parameters
     mode, side, l_min, l_max = output_file.split('_')[-4:]
     l_max = l_max.split('.')[0]
 
     # remeshing command
-    command = (f"hrtf_mesh_grading -x {l_min} -y {l_max} -s {side} "
-               f"-m {mode} "
-               f"-i {folders['mount']}/{input_file} "
-               f"-o {folders['mount']}/{output_file} ")
+    command = ["hrtf_mesh_grading", "-x", l_min, "-y", l_max, "-s", side,
+               "-m", mode,
+               "-i", f"{folders['mount']}/{input_file}",
+               "-o", f"{folders['mount']}/{output_file}"]
 
     # remesh
     exit_code, output = exec(container, command, False)
@@ -229,139 +573,127 @@ def test_grading_against_reference(input_file, output_file):
     assert exit_code == 0
 
     # load result and reference
-    test = trimesh.load_mesh(os.path.join(folders["test"], output_file))
-    ref = trimesh.load_mesh(os.path.join(folders["reference"], output_file))
+    copy_from_container(container, output_file)
+    test = load_vertices(os.path.join(folders["test"], output_file))
+    ref = references[output_file]
 
     # scale result if required
     if input_file.endswith('_m.ply'):
-        test.vertices *= 1000
+        test *= 1000
 
-    # check results with 1/1000 mm tolerance
-    npt.assert_almost_equal(test.vertices, ref.vertices, 3)
+    # check results with 1/1000 mm tolerance. The fast check uses the
+    # criterion of `assert_almost_equal`, which only runs on failure to get a
+    # detailed error message
+    if test.shape != ref.shape or \
+            not np.abs(test - ref).max() < 1.5e-3:
+        npt.assert_almost_equal(test, ref, 3)
 
 
-def test_verbosity():
+def test_verbosity(container):
     """
     Check the command line output in verbose mode
     """
 
-    lines = [
-        'input:', 'output:', 'mode: hybrid', 'side:', 'min. edge length: ',
-        'max. edge length: ', 'max. error: ', 'gamma scaling left/right',
-        'estimated ear channel entrance left',
-        'estimated ear channel entrance right',
-        'Faces before remeshing: ', 'Faces after remeshing: ']
+    commands = [
+        # use with verbosity
+        (f"hrtf_mesh_grading -v -x 1 -y 10 -s left "
+         f"-i {folders['mount'] + '/head_mm.ply'} "
+         f"-o {folders['tmp'] + '/head_tmp.ply'} "),
+        # use without verbosity
+        (f"hrtf_mesh_grading -x 1 -y 10 -s left "
+         f"-i {folders['mount'] + '/head_mm.ply'} "
+         f"-o {folders['tmp'] + '/head_tmp.ply'} ")]
 
-    # use with verbosity
-    command = (f"hrtf_mesh_grading -v -x 1 -y 10 -s left "
-               f"-i {folders['mount'] + '/head_mm.ply'} "
-               f"-o {folders['mount'] + '/head_tmp.ply'} ")
+    verbose, quiet = exec_batch(container, commands, False)
 
-    exit_code, output = exec(container, command, False)
+    exit_code, output = verbose
     assert exit_code == 0
-    for line in lines:
-        assert line in output
+    assert set(verbose_lines).issubset(verbose_pattern.findall(output))
 
-    # use without verbosity
-    command = (f"hrtf_mesh_grading -x 1 -y 10 -s left "
-               f"-i {folders['mount'] + '/head_mm.ply'} "
-               f"-o {folders['mount'] + '/head_tmp.ply'} ")
-
-    exit_code, output = exec(container, command, False)
+    exit_code, output = quiet
     assert exit_code == 0
-    for line in lines:
-        assert line not in output
+    assert verbose_pattern.search(output) is None
 
 
-def test_error_value():
+def test_error_value(container):
     """
     Test default and user value for error parameter `-e`
     """
 
-    # use with default error
-    command = (f"hrtf_mesh_grading -v -x 1 -y 10 -s left "
-               f"-i {folders['mount'] + '/head_mm.ply'} "
-               f"-o {folders['mount'] + '/head_tmp.ply'} ")
+    commands = [
+        # use with default error
+        (f"hrtf_mesh_grading -v -x 1 -y 10 -s left "
+         f"-i {folders['mount'] + '/head_mm.ply'} "
+         f"-o {folders['tmp'] + '/head_tmp.ply'} "),
+        # use with custom error
+        (f"hrtf_mesh_grading -v -x 1 -y 10 -e 2 -s left "
+         f"-i {folders['mount'] + '/head_mm.ply'} "
+         f"-o {folders['tmp'] + '/head_tmp.ply'} ")]
 
-    exit_code, output = exec(container, command, False)
-    assert exit_code == 0
-    assert "max. error: 1" in output
+    results = exec_batch(container, commands, False)
 
-    # use with custom error
-    command = (f"hrtf_mesh_grading -v -x 1 -y 10 -e 2 -s left "
-               f"-i {folders['mount'] + '/head_mm.ply'} "
-               f"-o {folders['mount'] + '/head_tmp.ply'} ")
+    for (exit_code, output), error in zip(results, [1, 2]):
+        assert exit_code == 0
+        assert f"max. error: {error}" in output
 
-    exit_code, output = exec(container, command, False)
-    assert exit_code == 0
-    assert "max. error: 2" in output
 
-
-def test_gamma_parameters():
+def test_gamma_parameters(container):
     """
     Test default and user value for gamma parameter `-g` and `-h`
     """
 
-    # use with default gamma parameters
-    command = (f"hrtf_mesh_grading -v -x 1 -y 10 -s left "
-               f"-i {folders['mount'] + '/head_mm.ply'} "
-               f"-o {folders['mount'] + '/head_tmp.ply'} ")
-
-    exit_code, output = exec(container, command, False)
-
-    assert exit_code == 0
-    assert "gamma scaling left/right: 0.15/0.15" in output
-    assert "estimated ear channel entrance left:   65.4298" in output
-    assert "estimated ear channel entrance right: -68.3508" in output
-    assert "after remeshing:  13950" in output
-
-    # use with left ear custom gamma parameter
-    command = ("hrtf_mesh_grading -v -x 1 -y 10 -s 'left' -g 0.18 "
-               f"-i {folders['mount'] + '/head_mm.ply'} "
-               f"-o {folders['mount'] + '/head_tmp.ply'} ")
-
-    exit_code, output = exec(container, command, False)
-
-    assert exit_code == 0
-    assert "gamma scaling left/right: 0.18/0.15" in output
-    assert "estimated ear channel entrance left:   59.6963" in output
-    assert "estimated ear channel entrance right: -68.3508" in output
-    assert "after remeshing:  13830" in output
-
-    # use with right ear custom gamma parameter
-    command = ("hrtf_mesh_grading -v -x 1 -y 10 -s 'left' -h 0.2 "
-               f"-i {folders['mount'] + '/head_mm.ply'} "
-               f"-o {folders['mount'] + '/head_tmp.ply'} ")
-
-    exit_code, output = exec(container, command, False)
-
-    assert exit_code == 0
-    assert "gamma scaling left/right: 0.15/0.2" in output
-    assert "estimated ear channel entrance left:   65.4298" in output
-    assert "estimated ear channel entrance right: -58.795" in output
-    assert "after remeshing:  13942" in output
-
-    # use with two custom gamma parameters
-    command = ("hrtf_mesh_grading -v -x 1 -y 10 -g 0 -s 'left' -g 0.18 -h 0.2 "
-               f"-i {folders['mount'] + '/head_mm.ply'} "
-               f"-o {folders['mount'] + '/head_tmp.ply'} ")
-
-    exit_code, output = exec(container, command, False)
-
-    assert exit_code == 0
-    assert "gamma scaling left/right: 0.18/0.2" in output
-    assert "estimated ear channel entrance left:   59.6963" in output
-    assert "estimated ear channel entrance right: -58.795" in output
-    assert "after remeshing:  13858" in output
-
-
-def test_custom_ear_channel_entries():
+    commands = [
+        # use with default gamma parameters
+        (f"hrtf_mesh_grading -v -x 1 -y 10 -s left "
+         f"-i {folders['mount'] + '/head_mm.ply'} "
+         f"-o {folders['tmp'] + '/head_tmp.ply'} "),
+        # use with left ear custom gamma parameter
+        ("hrtf_mesh_grading -v -x 1 -y 10 -s 'left' -g 0.18 "
+         f"-i {folders['mount'] + '/head_mm.ply'} "
+         f"-o {folders['tmp'] + '/head_tmp.ply'} "),
+        # use with right ear custom gamma parameter
+        ("hrtf_mesh_grading -v -x 1 -y 10 -s 'left' -h 0.2 "
+         f"-i {folders['mount'] + '/head_mm.ply'} "
+         f"-o {folders['tmp'] + '/head_tmp.ply'} "),
+        # use with two custom gamma parameters
+        ("hrtf_mesh_grading -v -x 1 -y 10 -g 0 -s 'left' -g 0.18 -h 0.2 "
+         f"-i {folders['mount'] + '/head_mm.ply'} "
+         f"-o {folders['tmp'] + '/head_tmp.ply'} ")]
+
+    expected = [
+        ["gamma scaling left/right: 0.15/0.15",
+         "estimated ear channel entrance left:   65.4298",
+         "estimated ear channel entrance right: -68.3508",
+         "after remeshing:  13950"],
+        ["gamma scaling left/right: 0.18/0.15",
+         "estimated ear channel entrance left:   59.6963",
+         "estimated ear channel entrance right: -68.3508",
+         "after remeshing:  13830"],
+        ["gamma scaling left/right: 0.15/0.2",
+         "estimated ear channel entrance left:   65.4298",
+         "estimated ear channel entrance right: -58.795",
+         "after remeshing:  13942"],
+        ["gamma scaling left/right: 0.18/0.2",
+         "estimated ear channel entrance left:   59.6963",
+         "estimated ear channel entrance right: -58.795",
+         "after remeshing:  13858"]]
+
+    results = exec_batch(container, commands, False)
+
+    for (exit_code, output), lines in zip(results, expected):
+        assert exit_code == 0
+        for line in lines:
+            assert line in output
+
+
+def test_custom_ear_channel_entries(container):
     """Test hybrid grading with custom ear channel entries"""
 
     # use with default gamma parameters
-    command = (f"hrtf_mesh_grading -v -x 1 -y 10 -s 'left' -l 60 -r -60 "
-               f"-i {folders['mount'] + '/head_mm.ply'} "
-               f"-o {folders['mount'] + '/head_tmp.ply'} ")
+    command = ["hrtf_mesh_grading", "-v", "-x", "1", "-y", "10", "-s", "left",
+               "-l", "60", "-r", "-60",
+               "-i", folders['mount'] + '/head_mm.ply',
+               "-o", folders['tmp'] + '/head_tmp.ply']
 
     exit_code, output = exec(container, command, False)
 
@@ -371,82 +703,75 @@ def test_custom_ear_channel_entries():
     assert "estimated" not in output
 
 
-def test_writing_binray_files():
+def test_writing_binray_files(container):
     """
     Test writing results as text and binary files and compare results
     """
 
-    # write as text file
-    command = (f"hrtf_mesh_grading -x 1 -y 10 -s left "
-               f"-i {folders['mount'] + '/head_mm.ply'} "
-               f"-o {folders['mount'] + '/head_remeshed_binary-false.ply'} ")
-
-    exit_code, output = exec(container, command, False)
-    assert exit_code == 0
-
-    # write as binary file
-    command = (f"hrtf_mesh_grading -b -x 1 -y 10 -s left "
-               f"-i {folders['mount'] + '/head_mm.ply'} "
-               f"-o {folders['mount'] + '/head_remeshed_binary-true.ply'} ")
-
-    exit_code, output = exec(container, command, False)
-    assert exit_code == 0
+    commands = [
+        # write as text file
+        (f"hrtf_mesh_grading -x 1 -y 10 -s left "
+         f"-i {folders['mount'] + '/head_mm.ply'} "
+         f"-o {folders['mount'] + '/head_remeshed_binary-false.ply'} "),
+        # write as binary file
+        (f"hrtf_mesh_grading -b -x 1 -y 10 -s left "
+         f"-i {folders['mount'] + '/head_mm.ply'} "
+         f"-o {folders['mount'] + '/head_remeshed_binary-true.ply'} "),
+        # get filesizes
+        (f"stat -c %s "
+         f"{folders['mount'] + '/head_remeshed_binary-false.ply'} "
+         f"{folders['mount'] + '/head_remeshed_binary-true.ply'} ")]
+
+    results = exec_batch(container, commands, False)
+    for exit_code, output in results:
+        assert exit_code == 0
+
+    for binary in ['false', 'true']:
+        copy_from_container(
+            container, f'head_remeshed_binary-{binary}.ply')
 
     # compare mesh
-    text = trimesh.load_mesh(
+    text = load_vertices(
         os.path.join(folders["test"], "head_remeshed_binary-false.ply"))
-    binary = trimesh.load_mesh(
+    binary = load_vertices(
         os.path.join(folders["test"], "head_remeshed_binary-true.ply"))
 
-    npt.assert_allclose(np.sort(text.vertices, 0),
-                        np.sort(binary.vertices, 0),
-                        atol=0.01)  # 0.01 mm tolerance
+    # sort vertices in place to compare them independent of their order
+    text.sort(axis=0)
+    binary.sort(axis=0)
+
+    npt.assert_allclose(text, binary, atol=0.01)  # 0.01 mm tolerance
 
     # compare filesize
-    assert \
-        os.path.getsize(os.path.join(
-            folders["test"], "head_remeshed_binary-false.ply")) > \
-        os.path.getsize(os.path.join(
-            folders["test"], "head_remeshed_binary-true.ply"))
+    size_text, size_binary = map(int, results[-1][1].split())
+    assert size_text > size_binary
 
 
-def test_assertions():
+def test_assertions(container):
     """
     Test assertions for incorrect calls of hrtf_mesh_grading
     """
 
-    # use with min edge length -x
-    command = (f"hrtf_mesh_grading -y 10 -s left "
-               f"-i {folders['mount'] + '/head_mm.ply'} "
-               f"-o {folders['mount'] + '/head_tmp.ply'} ")
-
-    exit_code, output = exec(container, command, False)
-    assert exit_code == 1
-    assert 'Example usage' in output
-
-    # use with max edge length -y
-    command = (f"hrtf_mesh_grading -x 1 -s left "
-               f"-i {folders['mount'] + '/head_mm.ply'} "
-               f"-o {folders['mount'] + '/head_tmp.ply'} ")
-
-    exit_code, output = exec(container, command, False)
-    assert exit_code == 1
-    assert 'Example usage' in output
-
-    # use with side -s
-    command = (f"hrtf_mesh_grading -x 1 -y 10 "
-               f"-i {folders['mount'] + '/head_mm.ply'} "
-               f"-o {folders['mount'] + '/head_tmp.ply'} ")
-
-    exit_code, output = exec(container, command, False)
-    assert exit_code == 1
-    assert 'Example usage' in output
-
-    # use with invalid mode -m
-    command = (f"hrtf_mesh_grading -x 1 -y 10 -s left -m hyper "
-               f"-i {folders['mount'] + '/head_mm.ply'} "
-               f"-o {folders['mount'] + '/head_tmp.ply'} ")
-
-    exit_code, output = exec(container, command, False)
-    assert exit_code == 134
-    assert "Invalid mode! Mode must be 'hybrid' or 'distance'" in output
+    # arguments, expected exit code, and expected output
+    calls = [
+        # use with min edge length -x
+        ("-y 10 -s left", 1, 'Example usage'),
+        # use with max edge length -y
+        ("-x 1 -s left", 1, 'Example usage'),
+        # use with side -s
+        ("-x 1 -y 10", 1, 'Example usage'),
+        # use with invalid mode -m
+        ("-x 1 -y 10 -s left -m hyper", 134,
+         "Invalid mode! Mode must be 'hybrid' or 'distance'")]
+
+    commands = [(f"hrtf_mesh_grading {arguments} "
+                 f"-i {folders['mount'] + '/head_mm.ply'} "
+                 f"-o {folders['tmp'] + '/head_tmp.ply'} ")
+                for arguments, _, _ in calls]
+
+    results = exec_batch(container, commands, False)
+
+    for (exit_code, output), (_, expected_code, expected_output) in \
+            zip(results, calls):
+        assert exit_code == expected_code
+        assert expected_output in output